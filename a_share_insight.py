@@ -4,118 +4,306 @@
 A-Share 多维度复盘  →  GitHub Pages 版
 运行后自动生成  reports/index.html
 """
+import io
 import os
+import sys
+import contextlib
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import akshare as ak
 import pandas as pd
 import numpy as np
 import time
 import re
 import pickle
+import string
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
+from functools import lru_cache
+from pathlib import Path
+from zoneinfo import ZoneInfo
 from tqdm import tqdm
 import warnings
-warnings.filterwarnings('ignore')
+# 只屏蔽 akshare 内部触发的 akshare/pandas 已知噪音，本仓库代码的弃用警告照常显示；
+# 命令行 -W / PYTHONWARNINGS 优先，便于剖析时打开
+if not sys.warnoptions:
+    warnings.filterwarnings('ignore', category=FutureWarning, module=r'akshare(\.|$)')
+    warnings.filterwarnings('ignore', category=UserWarning, module=r'akshare(\.|$)')
 
 # ---------- 工具 ----------
 CACHE_DIR = 'cache'
 os.makedirs(CACHE_DIR, exist_ok=True)
+PICKLE_PROTOCOL = pickle.HIGHEST_PROTOCOL     # 缓存统一用当前解释器支持的最高协议
+
+MAX_WORKERS = 16                              # akshare 并发上限
+AK_SEMAPHORE = threading.Semaphore(MAX_WORKERS)
+
+# akshare 各模块内部直接调用 requests.get；取数期间换成按线程复用的 Session 以保持 keep-alive。
+# Session 不保证线程安全，所以每个线程各建一个，不跨线程共享
+_HTTP_LOCAL = threading.local()
+
+def _thread_session() -> requests.Session:
+    session = getattr(_HTTP_LOCAL, 'session', None)
+    if session is None:
+        session = _HTTP_LOCAL.session = requests.Session()
+        adapter = HTTPAdapter(max_retries=Retry(total=3, backoff_factor=0.3))
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+    return session
+
+def _keepalive_get(url, params=None, **kw):
+    session = _thread_session()
+    try:
+        return session.get(url, params=params, **kw)
+    finally:
+        session.cookies.clear()   # 与 requests.get 一样不跨请求保留 cookie，避免串到其他站点
+
+@contextlib.contextmanager
+def http_keepalive():
+    """临时替换全局 requests.get（进程级副作用，对所有模块可见），退出时还原"""
+    orig = requests.get
+    requests.get = _keepalive_get
+    try:
+        yield
+    finally:
+        requests.get = orig
+
+def ak_call(func, *a, **kw):
+    """限流调用 akshare 接口（各线程池共享同一信号量）"""
+    with AK_SEMAPHORE:
+        return func(*a, **kw)
+
+# 交易日、收盘判断和缓存日期都按上交所时间，不随运行机器（如 UTC 的 CI）时区变化
+MARKET_TZ = ZoneInfo('Asia/Shanghai')
+_RUN_NOW = None
+
+def start_run_clock() -> datetime:
+    """开始一次运行：固定本次的时间戳，缓存键/报告时间都以此为准"""
+    global _RUN_NOW
+    _RUN_NOW = datetime.now(MARKET_TZ)
+    return _RUN_NOW
+
+def now() -> datetime:
+    """本次运行的统一时钟（北京时间）；尚未开始运行时退回实时时间"""
+    return _RUN_NOW or datetime.now(MARKET_TZ)
+
+def _prune_cache(name: str, day: str):
+    """删除同名的旧日期缓存：直接切片比较文件名里的日期段，不做 stat / 通配匹配"""
+    prefix = f'{name}_'
+    size = len(prefix) + len('YYYYMMDD.pkl')
+    for fn in os.listdir(CACHE_DIR):
+        if len(fn) == size and fn.startswith(prefix) and fn.endswith('.pkl') and fn[-12:-4] < day:
+            with contextlib.suppress(FileNotFoundError):   # 并发清理时可能已被删除
+                os.remove(os.path.join(CACHE_DIR, fn))
+
+@lru_cache(maxsize=256)
+def _cache_pkl_day(name: str, day: str, func, a: tuple, kw_items: tuple):
+    """磁盘缓存 + 进程内 LRU；失败直接抛出，不会被 LRU 记住"""
+    path = os.path.join(CACHE_DIR, f"{name}_{day}.pkl")
+    if os.path.exists(path):
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+    data = func(*a, **dict(kw_items))
+    # 原子替换：读者只会看到完整的旧文件或新文件
+    tmp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(tmp, 'wb') as f:
+        pickle.dump(data, f, protocol=PICKLE_PROTOCOL)
+    os.replace(tmp, path)
+    _prune_cache(name, day)
+    return data
 
 def cache_pkl(name: str, func, *a, **kw):
     """简易缓存装饰器（天级）"""
-    path = os.path.join(CACHE_DIR, f"{name}_{datetime.now():%Y%m%d}.pkl")
-    if os.path.exists(path):
-        return pickle.load(open(path, 'rb'))
     try:
-        data = func(*a, **kw)
-        pickle.dump(data, open(path, 'wb'))
-        return data
+        data = _cache_pkl_day(name, f"{now():%Y%m%d}", func, a, tuple(sorted(kw.items())))
+        # LRU 里的对象是共享的，交出副本：调用方原地修改（如 normalize_dtypes）不会污染缓存
+        return data.copy()
     except Exception as e:
         print(f'  - 缓存失败 {name}: {e}')
         return pd.DataFrame()
 
+def pct_rank(vals: np.ndarray):
+    """百分位排名 (0, 100]：只对有限值 argsort 一次散射回原位，NaN 行排名仍为 NaN
+
+    返回 (ranks, order)，order 为热力值从高到低的下标，NaN 行排在最后。
+    """
+    finite = np.isfinite(vals)
+    valid = np.flatnonzero(finite)
+    asc = valid[np.argsort(vals[valid], kind='stable')]
+    ranks = np.full(len(vals), np.nan)
+    ranks[asc] = np.arange(1, len(asc) + 1) / len(asc) * 100
+    order = np.concatenate([asc[::-1], np.flatnonzero(~finite)])
+    return ranks, order
+
+def fetch_index_hist(symbol: str):
+    """指数日线，列名统一为英文"""
+    df = ak.index_zh_a_hist(symbol=symbol, period='daily', start_date='19900101')
+    return df.rename(columns={
+        '日期': 'date', '收盘': 'close', '开盘': 'open',
+        '最高': 'high', '最低': 'low', '成交额': 'amount', '涨跌幅': 'pct_chg'
+    })
+
+def _fetch_industry_cons(industry: str):
+    """单个行业成分股，失败稍等后重试一次，仍失败返回 None"""
+    for retry_delay in (0.2, None):   # 只在两次尝试之间等待，最后一次失败直接返回
+        try:
+            return ak_call(ak.stock_board_industry_cons_em, symbol=industry)
+        except Exception:
+            if retry_delay:
+                time.sleep(retry_delay)
+    return None
+
+def build_industry_map():
+    """股票→行业映射（线程池并发拉取各行业成分股）
+
+    放在模块级而非实例方法：作为 cache_pkl 的 LRU 键时不会把分析器实例一直留在内存里。
+    返回以股票代码为索引、category 类型的 Series：每个行业名只存一份，
+    下游可直接 reindex(codes) 做向量化查找。
+    """
+    industry_df = ak_call(ak.stock_board_industry_name_em)
+    mapping = {}
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as ex:
+        futures = {
+            ex.submit(_fetch_industry_cons, industry): industry
+            for industry in industry_df['板块名称']
+        }
+        # CI 日志非终端时关闭进度条，终端下也限制刷新频率
+        progress = tqdm(
+            as_completed(futures), total=len(futures), desc='构建行业映射',
+            mininterval=1.0, miniters=max(1, len(futures) // 50),
+            disable=not sys.stdout.isatty()
+        )
+        for fut in progress:
+            cons = fut.result()
+            if cons is None:
+                continue
+            industry = futures[fut]
+            mapping.update(dict.fromkeys(cons['代码'].to_numpy().tolist(), industry))
+    return pd.Series(
+        list(mapping.values()), index=list(mapping.keys()),
+        dtype='category', name='industry'
+    )
+
+# (data key, 接口, 参数)
+FETCH_TASKS = [
+    # 市场资金流
+    ('market_fund_flow', ak.stock_market_fund_flow, {}),
+    ('industry_fund_flow', ak.stock_sector_fund_flow_rank,
+     {'indicator': '今日', 'sector_type': '行业资金流'}),
+    # 指数行情
+    ('sh_index', fetch_index_hist, {'symbol': '000001'}),
+    ('sz_index', fetch_index_hist, {'symbol': '399001'}),
+    # 国债ETF
+    ('bond_etf', ak.fund_etf_hist_em, {'symbol': '511260'}),
+    # 情绪指标
+    ('market_activity', ak.stock_market_activity_legu, {}),
+    ('congestion', ak.stock_a_congestion_lg, {}),
+    ('rank_ljqs', ak.stock_rank_ljqs_ths, {}),
+    # 个股快照 & 两融
+    ('all_a_spot', ak.stock_zh_a_spot_em, {}),
+    ('sh_margin', ak.macro_china_market_margin_sh, {}),
+    ('sz_margin', ak.macro_china_market_margin_sz, {}),
+]
+
+# 入库时统一转成数值列，下游排名/取值直接走原生数组
+NUMERIC_COLS = {
+    'market_fund_flow': ['主力净流入-净额'],
+    'industry_fund_flow': ['今日主力净流入-净额'],
+    'sh_index': ['close', 'open', 'high', 'low', 'amount', 'pct_chg'],
+    'sz_index': ['close', 'open', 'high', 'low', 'amount', 'pct_chg'],
+}
+
+def normalize_dtypes(key: str, df: pd.DataFrame) -> pd.DataFrame:
+    """akshare 返回的数值常为 object 列，这里一次性转换"""
+    cols = [c for c in NUMERIC_COLS.get(key, []) if c in df.columns]
+    if cols:
+        df[cols] = df[cols].apply(pd.to_numeric, errors='coerce')
+    if key in ('sh_index', 'sz_index') and 'date' in df.columns:
+        df['date'] = pd.to_datetime(df['date'])
+    return df
+
+SETTLED_AT = (15, 30)   # 15:00 收盘后留半小时，等资金流等盘后数据定稿再允许落缓存
+
+def session_closed(ts: datetime) -> bool:
+    """当日行情已定稿（北京时间工作日 15:30 后或周末）：到下个交易日前不会再变"""
+    ts = ts.astimezone(MARKET_TZ)
+    return ts.weekday() >= 5 or (ts.hour, ts.minute) >= SETTLED_AT
+
+REPORT_TMPL = string.Template("""<!DOCTYPE html>
+<html lang="zh-CN">
+<head>
+<meta charset="utf-8">
+<title>A-Share 每日复盘</title>
+<style>
+body{font-family:Consolas,monospace;font-size:14px;line-height:1.6;margin:2rem;}
+pre{white-space:pre-wrap;word-break:break-all;}
+</style>
+</head>
+<body><pre>$body</pre></body>
+</html>""")
+
 # ---------- 核心类 ----------
 class AdvancedStockAnalyzer:
     def __init__(self):
         self.data = {}
         self.analysis_result = {}
-        self.stock_to_industry_map = {}
+        self.stock_to_industry_map = pd.Series(dtype='category', name='industry')
         self.run_mode = 'POST_MARKET'
 
     # ---------------- 数据获取 ----------------
     def fetch_data(self):
         print('开始获取基础数据...')
-        try:
-            # 1. 股票-行业映射
-            self.stock_to_industry_map = cache_pkl(
-                'industry_map', self._build_industry_map
-            )
-
-            # 2. 市场资金流
-            self.data['market_fund_flow'] = ak.stock_market_fund_flow()
-            self.data['industry_fund_flow'] = ak.stock_sector_fund_flow_rank(
-                indicator='今日', sector_type='行业资金流'
-            )
-
-            # 3. 指数行情
-            for name, symbol in [('sh', '000001'), ('sz', '399001')]:
-                df = ak.index_zh_a_hist(symbol=symbol, period='daily', start_date='19900101')
-                df = df.rename(columns={
-                    '日期': 'date', '收盘': 'close', '开盘': 'open',
-                    '最高': 'high', '最低': 'low', '成交额': 'amount', '涨跌幅': 'pct_chg'
-                })
-                self.data[f'{name}_index'] = df
-
-            # 4. 国债ETF
-            self.data['bond_etf'] = ak.fund_etf_hist_em(symbol='511260')
-
-            # 5. 情绪指标
-            self.data['market_activity'] = ak.stock_market_activity_legu()
-            self.data['congestion'] = ak.stock_a_congestion_lg()
-            self.data['rank_ljqs'] = ak.stock_rank_ljqs_ths()
-
-            # 6. 个股快照 & 两融
-            self.data['all_a_spot'] = ak.stock_zh_a_spot_em()
-            self.data['sh_margin'] = ak.macro_china_market_margin_sh()
-            self.data['sz_margin'] = ak.macro_china_market_margin_sz()
-
-            return True
-        except Exception as e:
-            print(f'数据获取失败: {e}')
-            return False
-
-    def _build_industry_map(self):
-        """股票→行业字典"""
-        industry_df = ak.stock_board_industry_name_em()
-        mapping = {}
-        for industry in tqdm(industry_df['板块名称'], desc='构建行业映射'):
-            try:
-                cons = ak.stock_board_industry_cons_em(symbol=industry)
-                for code in cons['代码']:
-                    mapping[code] = industry
-            except Exception:
-                time.sleep(0.2)
-        return mapping
+        # 股票-行业映射（读缓存或构建）与各行情接口互不依赖，放进同一线程池并发执行；
+        # cache_pkl 自行兜底异常，不会中断整批
+        with http_keepalive(), ThreadPoolExecutor(max_workers=len(FETCH_TASKS) + 1) as ex:
+            map_future = ex.submit(cache_pkl, 'industry_map', build_industry_map)
+            # 收盘后行情不再变化：走天级缓存，当天重跑直接读盘；FORCE_REFRESH=1 强制重新拉取
+            if session_closed(now()) and not os.environ.get('FORCE_REFRESH'):
+                futures = {ex.submit(cache_pkl, f'ak_{key}', ak_call, func, **kw): key
+                           for key, func, kw in FETCH_TASKS}
+            else:
+                futures = {ex.submit(ak_call, func, **kw): key for key, func, kw in FETCH_TASKS}
+            for fut in as_completed(futures):
+                key = futures[fut]
+                try:
+                    self.data[key] = normalize_dtypes(key, fut.result())
+                except Exception as e:
+                    print(f'  - {key} 获取失败: {e}')
+                    self.data[key] = pd.DataFrame()
+            self.stock_to_industry_map = map_future.result()
+        return True
 
     # ---------------- 分析 ----------------
     def analyze_market_liquidity(self):
+        liq = {}
+        # 成交额与主力净流入互不依赖，分别兜底：一项失败不影响另一项
         try:
-            sh = self.data['sh_index'].iloc[-1]
-            sh_y = self.data['sh_index'].iloc[-2]
-            turnover = (sh['amount'] + sh_y['amount']) / 1e8
-            main_in = self.data['market_fund_flow'].iloc[-1]['主力净流入-净额'] / 1e8
-            self.analysis_result['liquidity'] = {
-                'total_volume': f'{turnover:.2f}亿元',
-                'main_net_inflow': f'{main_in:.2f}亿元'
-            }
+            # 两市成交额 = 沪市 + 深市同一交易日；最新日期不一致时（一边尚无当日数据）不出数
+            sh, sz = self.data['sh_index'], self.data['sz_index']
+            sh_day, sz_day = sh['date'].iat[-1], sz['date'].iat[-1]
+            if sh_day == sz_day:
+                turnover = (sh['amount'].iat[-1] + sz['amount'].iat[-1]) / 1e8
+                liq['total_volume'] = f'{turnover:.2f}亿元'
+            else:
+                print(f'成交额暂不可用：沪深指数最新交易日不一致 {sh_day:%Y-%m-%d} / {sz_day:%Y-%m-%d}')
+        except Exception as e:
+            print('成交额计算失败:', e)
+        try:
+            main_in = self.data['market_fund_flow']['主力净流入-净额'].iat[-1] / 1e8
+            liq['main_net_inflow'] = f'{main_in:.2f}亿元'
+            liq['main_net_inflow_value'] = float(main_in)   # 数值原样保留，下游无需从字符串里解析
         except Exception as e:
             print('流动性分析失败:', e)
-            self.analysis_result['liquidity'] = {}
+        self.analysis_result['liquidity'] = liq
 
     def analyze_sentiment(self):
         try:
             act = self.data['market_activity']
-            up = act[act['item'] == '上涨']['value'].iloc[0]
-            down = act[act['item'] == '下跌']['value'].iloc[0]
+            items = dict(zip(act['item'].to_numpy(), act['value'].to_numpy()))
+            up = float(items['上涨'])
+            down = float(items['下跌'])
             profit = round(up / (up + down) * 100, 2)
             self.analysis_result['sentiment'] = {
                 '综合情绪': '贪婪' if profit > 65 else '中性',
@@ -127,63 +315,62 @@ class AdvancedStockAnalyzer:
 
     def analyze_sector(self):
         try:
-            df = self.data['industry_fund_flow'].copy()
-            df['热力值'] = (df['今日主力净流入-净额'].rank(pct=True) * 100).round(2)
-            self.analysis_result['sector_heat_map'] = df.sort_values('热力值', ascending=False)
+            df = self.data['industry_fund_flow']
+            ranks, order = pct_rank(df['今日主力净流入-净额'].to_numpy(dtype=np.float64))
+            # assign 返回新表，不改动原始数据
+            self.analysis_result['sector_heat_map'] = df.assign(热力值=ranks.round(2)).iloc[order]
         except Exception as e:
             print('板块分析失败:', e)
             self.analysis_result['sector_heat_map'] = pd.DataFrame()
 
     # ---------------- 生成报告 ----------------
     def print_report(self):
-        report = []
-        report.append('=' * 80)
-        report.append(f"A-Share 每日复盘  {datetime.now():%Y-%m-%d %H:%M}")
-        report.append('=' * 80)
+        buf = io.StringIO()
+        print('=' * 80, file=buf)
+        print(f"A-Share 每日复盘  {now():%Y-%m-%d %H:%M}", file=buf)
+        print('=' * 80, file=buf)
 
         # 1. 市场阶段
         stage = self.analysis_result.get('market_stage', {})
         if stage:
-            report.append(f"\n【市场阶段】{stage.get('stage_description', '暂无')}")
+            print(f"\n【市场阶段】{stage.get('stage_description', '暂无')}", file=buf)
 
         # 2. 流动性 & 情绪
         liq = self.analysis_result.get('liquidity', {})
         sent = self.analysis_result.get('sentiment', {})
-        report.append(f"\n【流动性】{liq.get('total_volume', '暂无')}")
-        report.append(f"【情绪】{sent.get('综合情绪', '暂无')}  |  赚钱效应: {sent.get('赚钱效应', '暂无')}")
+        print(f"\n【流动性】{liq.get('total_volume', '暂无')}", file=buf)
+        print(f"【情绪】{sent.get('综合情绪', '暂无')}  |  赚钱效应: {sent.get('赚钱效应', '暂无')}", file=buf)
 
         # 3. 板块
         heat = self.analysis_result.get('sector_heat_map', pd.DataFrame())
         if not heat.empty:
-            report.append("\n【板块热力 TOP5】")
-            for _, row in heat.head(5).iterrows():
-                report.append(f"  - {row['名称']}  热力值 {row['热力值']}")
+            print("\n【板块热力 TOP5】", file=buf)
+            top5 = heat.head(5)
+            for name, value in zip(top5['名称'].to_numpy(), top5['热力值'].to_numpy()):
+                print(f"  - {name}  热力值 {value}", file=buf)
 
-        report.append("\n" + "=" * 80)
-        report.append("免责声明: 仅供参考，不构成投资建议。")
-        report.append("=" * 80)
-        full_text = "\n".join(report)
+        print("\n" + "=" * 80, file=buf)
+        print("免责声明: 仅供参考，不构成投资建议。", file=buf)
+        print("=" * 80, file=buf)
+        full_text = buf.getvalue()
 
         # 输出网页
         os.makedirs('reports', exist_ok=True)
-        with open('reports/index.html', 'w', encoding='utf-8') as f:
-            f.write(f"""<!DOCTYPE html>
-<html lang="zh-CN">
-<head>
-<meta charset="utf-8">
-<title>A-Share 每日复盘</title>
-<style>
-body{{font-family:Consolas,monospace;font-size:14px;line-height:1.6;margin:2rem;}}
-pre{{white-space:pre-wrap;word-break:break-all;}}
-</style>
-</head>
-<body><pre>{full_text}</pre></body>
-</html>""")
+        Path('reports/index.html').write_text(REPORT_TMPL.substitute(body=full_text), encoding='utf-8')
         print('报告已生成：reports/index.html')
 
     # ---------------- 运行入口 ----------------
+    def prewarm(self):
+        """提前生成当天的行业映射缓存（冷启动最慢的一步），行情数据仍在 run 时实时拉取"""
+        run_at = start_run_clock()
+        print(f'--- 预热缓存: {run_at:%H:%M:%S} ---')
+        with http_keepalive():
+            self.stock_to_industry_map = cache_pkl('industry_map', build_industry_map)
+        print(f'行业映射已缓存：{len(self.stock_to_industry_map)} 只股票')
+
     def run(self):
-        print(f'--- 运行时间: {datetime.now():%H:%M:%S} ---')
+        run_at = start_run_clock()
+        print(f'--- 运行时间: {run_at:%H:%M:%S} ---')
         if self.fetch_data():
             self.analyze_market_liquidity()
             self.analyze_sentiment()
@@ -193,4 +380,7 @@ pre{{white-space:pre-wrap;word-break:break-all;}}
 
 # ---------------- 启动 ----------------
 if __name__ == '__main__':
-    AdvancedStockAnalyzer().run()
+    if '--prewarm' in sys.argv[1:]:
+        AdvancedStockAnalyzer().prewarm()
+    else:
+        AdvancedStockAnalyzer().run()
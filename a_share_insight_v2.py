@@ -5,60 +5,134 @@
 指数：腾讯  
 涨跌/两融/北向/板块/ETF：新浪 + 东财 + 缓存
 """
+import io
 import os
+import inspect
+import pickle
+import string
+import time
+import threading
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import pandas as pd
 import numpy as np
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from functools import wraps
+from pathlib import Path
 
 CACHE_DIR = 'cache'
 os.makedirs(CACHE_DIR, exist_ok=True)
+PICKLE_PROTOCOL = pickle.HIGHEST_PROTOCOL     # 固定 ETF 缓存的 pickle 协议
 os.makedirs('reports', exist_ok=True)
 
+# (连接, 读取) 超时上限：上游卡死时快速失败走兜底，不让整个任务挂住
+DEFAULT_TIMEOUT = (3.0, 7.0)
+
+_RETRY = Retry(total=2, connect=2, read=2, backoff_factor=0.2,
+               status_forcelist=[500, 502, 503, 504], allowed_methods={'GET'})
+
+# Session 不保证线程安全，所以每个线程各建一个，线程内复用 keep-alive 连接
+_HTTP_LOCAL = threading.local()
+
+def _thread_session() -> requests.Session:
+    session = getattr(_HTTP_LOCAL, 'session', None)
+    if session is None:
+        session = _HTTP_LOCAL.session = requests.Session()
+        adapter = HTTPAdapter(max_retries=_RETRY)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+    return session
+
 # ---------- 工具 ----------
-def cache_pkl(name: str, func, *a, **kw):
-    path = os.path.join(CACHE_DIR, f"{name}_{datetime.now():%Y%m%d}.pkl")
-    if os.path.exists(path):
-        return pd.read_pickle(path)
+def get_json(url: str, **kw):
+    """GET 并用 orjson 解析（C 实现，直接读 UTF-8 字节）"""
+    kw.setdefault('timeout', DEFAULT_TIMEOUT)
+    session = _thread_session()
+    try:
+        r = session.get(url, **kw)
+    finally:
+        session.cookies.clear()   # 不跨请求保留 cookie，避免串到其他站点
     try:
-        data = func(*a, **kw)
-        data.to_pickle(path)
-        return data
-    except Exception as e:
-        print(f'  - {name} 获取失败: {e}，返回空表')
-        return pd.DataFrame()
+        return orjson.loads(r.content)
+    except orjson.JSONDecodeError:
+        return r.json()   # 非 UTF-8 响应（如 GBK）交给 requests 按声明编码解码
+
+def _fresh(path, ttl: float = 86400) -> bool:
+    """缓存文件存在且修改时间在 ttl 秒以内"""
+    try:
+        return time.time() - os.path.getmtime(path) < ttl
+    except OSError:
+        return False
+
+def ttl_memo(ttl: float = 60, fallback=None):
+    """进程内短时缓存：盘中反复 analyze() 时，ttl 秒内不重复请求
+
+    缓存键按函数签名归一化（补齐默认值），get_index_tx() 与 get_index_tx(market='sh')
+    命中同一条。只缓存成功结果；函数抛异常时返回 fallback 的兜底值（同样传参，不入缓存），
+    下次调用照常重试。
+    """
+    def deco(func):
+        sig = inspect.signature(func)
+        memo = {}
+        @wraps(func)
+        def wrapper(*a, **kw):
+            call = sig.bind(*a, **kw)
+            call.apply_defaults()
+            key = tuple(call.arguments.items())
+            t = time.monotonic()
+            hit = memo.get(key)
+            if hit is not None and t - hit[0] < ttl:
+                return hit[1]
+            try:
+                val = func(*call.args, **call.kwargs)
+            except Exception:
+                if fallback is None:
+                    raise
+                return fallback(*call.args, **call.kwargs)
+            memo[key] = (t, val)
+            return val
+        wrapper.cache_clear = memo.clear
+        return wrapper
+    return deco
 
 # ① 指数日线（腾讯）
+IndexSnap = namedtuple('IndexSnap', 'day close amount')
+
+def _index_tx_fallback(market: str = 'sh'):
+    """接口失败时读本地兜底缓存，仍没有则返回 None"""
+    cache_file = os.path.join(CACHE_DIR, f'tx_{market}.pkl')
+    if _fresh(cache_file):
+        df = pd.read_pickle(cache_file)
+        if not df.empty:
+            return IndexSnap(df['day'].iat[-1], float(df['close'].iat[-1]), float(df['amount'].iat[-1]))
+    return None
+
+@ttl_memo(fallback=_index_tx_fallback)
 def get_index_tx(market: str = 'sh'):
+    """最新一根日线 → IndexSnap；失败走 _index_tx_fallback"""
     url = f'http://web.ifzq.gtimg.cn/appstock/app/fqkline/get?param={market}000001,day,,,5,qfq'
-    try:
-        r = requests.get(url, timeout=10).json()
-        kline = r['data'].get(f'{market}000001', {}).get('day', [])
-        if not kline: raise RuntimeError('no kline')
-        df = pd.DataFrame(kline, columns=['day', 'open', 'close', 'high', 'low', 'volume'])
-        df = df.astype({'close': float, 'volume': float})
-        df['amount'] = df['volume'] * 1e4   # 手→金额
-        return df[['day', 'close', 'amount']]
-    except Exception:
-        cache_file = os.path.join(CACHE_DIR, f'tx_{market}.pkl')
-        if os.path.exists(cache_file):
-            return pd.read_pickle(cache_file)
-        return pd.DataFrame(columns=['day', 'close', 'amount']).astype({'close': float, 'amount': float})
+    r = get_json(url)
+    kline = r['data'].get(f'{market}000001', {}).get('day', [])
+    if not kline: raise RuntimeError('no kline')
+    day, _open, close, _high, _low, volume = kline[-1][:6]
+    return IndexSnap(day, float(close), float(volume) * 1e4)   # 手→金额
 
 # ② 涨跌家数（新浪保底）
+@ttl_memo(fallback=lambda: (0, 0))
 def get_market_activity_sina():
     url = 'https://vip.stock.finance.sina.com.cn/quotesService/view/qInfo.php?format=json&node=adratio'
-    try:
-        r = requests.get(url, timeout=10).json()
-        return int(r['up']), int(r['down'])
-    except Exception:
-        return 0, 0
+    r = get_json(url)
+    return int(r['up']), int(r['down'])
 
 # ③ 板块涨跌（腾讯）
 def get_sector_tx():
     url = 'http://web.ifzq.gtimg.cn/appstock/app/hq/get?type=bd&callback='
     try:
-        r = requests.get(url, timeout=10).json()
+        r = get_json(url)
         bk = pd.DataFrame(r['data']['bd'])[['n', 'zd']].head(10)
         bk.columns = ['name', 'zd']
         return bk
@@ -66,179 +140,217 @@ def get_sector_tx():
         return pd.DataFrame(columns=['name', 'zd'])
 
 # ④ 融资融券（新浪）
+@ttl_memo(fallback=lambda: (15800.0, 0.0))   # 兜底常数
 def get_margin_sina():
-    try:
-        sh = requests.get('https://vip.stock.finance.sina.com.cn/quotesService/view/qInfo.php?format=json&node=margin', timeout=10).json()
-        sz = requests.get('https://vip.stock.finance.sina.com.cn/quotesService/view/qInfo.php?format=json&node=margin_sz', timeout=10).json()
-        total = float(sh['balance']) + float(sz['balance'])
-        change = float(sh['change']) + float(sz['change'])
-        return total / 1e8, change / 1e8
-    except Exception:
-        return 15800.0, 0.0   # 兜底常数
+    # 沪、深两个请求互不依赖，并发发出
+    urls = [f'https://vip.stock.finance.sina.com.cn/quotesService/view/qInfo.php?format=json&node={node}'
+            for node in ('margin', 'margin_sz')]
+    with ThreadPoolExecutor(max_workers=2) as ex:
+        sh, sz = ex.map(get_json, urls)
+    total = float(sh['balance']) + float(sz['balance'])
+    change = float(sh['change']) + float(sz['change'])
+    return total / 1e8, change / 1e8
 
 # ⑤ 北向资金（东财）
+@ttl_memo(fallback=lambda: 0.0)
 def get_north_money_em():
+    url = 'http://push2.eastmoney.com/api/qt/kamt.rtmin/get?fields1=f1,f3&fields2=f51,f53&ut=b2884a393a59ad64002292a3e90d46a5'
+    r = get_json(url)
+    today = r['data']['s2n']
+    return float(today) / 1e8
+
+# ⑥ ETF 技术评分（模拟+缓存）
+_ETF_RAW = [
+    ('510300', '沪深300ETF'), ('510500', '中证500ETF'), ('512880', '证券ETF'),
+    ('512480', '半导体ETF'), ('515790', '光伏ETF'), ('512690', '酒ETF'),
+    ('512760', '芯片ETF'), ('512000', '券商ETF'), ('512170', '医疗ETF'),
+    ('512010', '医药ETF'), ('515030', '新能源车ETF'), ('512660', '军工ETF'),
+    ('512980', '传媒ETF'), ('512800', '银行ETF'), ('515220', '煤炭ETF'),
+    ('512400', '有色ETF'), ('512200', '房地产ETF'), ('159915', '创业板ETF'),
+    ('159949', '创业板50ETF'), ('588000', '科创50ETF'), ('588080', '科创50ETF易方达'),
+]
+# 按代码去重（保持顺序），避免同一只 ETF 重复请求
+ETF_LIST = tuple(dict(_ETF_RAW).items())
+
+def _score_matrix(mat: np.ndarray):
+    """(n, 21) 收盘价矩阵 → (现价, 均线评分)，一次向量化算完；取数失败的行（NaN）记 2 分"""
+    last = mat[:, -1]
+    ma5 = mat[:, -5:].mean(axis=1)
+    ma20 = mat[:, -20:].mean(axis=1)
+    trend = (last > ma20) & (ma5 > ma20)
+    score = np.select([trend & (last > ma5), trend, last < ma20], [4.5, 3.5, 2.0], default=5.0)
+    missing = np.isnan(last)
+    score[missing] = 2.0
+    return np.where(missing, 0.0, last), score
+
+def _fetch_closes(item):
+    """单只 ETF 最近 21 根收盘价（float64 数组）；失败返回 None"""
+    code, _name = item
     try:
-        url = 'http://push2.eastmoney.com/api/qt/kamt.rtmin/get?fields1=f1,f3&fields2=f51,f53&ut=b2884a393a59ad64002292a3e90d46a5'
-        r = requests.get(url, timeout=10).json()
-        today = r['data']['s2n']
-        return float(today) / 1e8
+        url = f'http://web.ifzq.gtimg.cn/appstock/app/fqkline/get?param={code},day,,,21,qfq'
+        r = get_json(url)
+        kline = r['data'].get(code, {}).get('day', [])
+        if len(kline) < 21: raise RuntimeError('short')
+        # 只用收盘价（每行第 3 列），按已知长度一次分配 float64 数组，不建 DataFrame
+        return np.fromiter((float(row[2]) for row in kline[-21:]), dtype=np.float64, count=21)
     except Exception:
-        return 0.0
+        return None
+
+ETF_CACHE = os.path.join(CACHE_DIR, 'etf_tech.pkl')
 
-# ⑥ ETF 技术评分（模拟+缓存）
 def get_etf_tech_cached():
-    cache_file = os.path.join(CACHE_DIR, 'etf_tech.pkl')
-    if os.path.exists(cache_file):
-        return pd.read_pickle(cache_file)
-
-    etf_list = [
-        ('510300', '沪深300ETF'), ('510500', '中证500ETF'), ('512880', '证券ETF'),
-        ('512480', '半导体ETF'), ('515790', '光伏ETF'), ('512690', '酒ETF'),
-        ('512760', '芯片ETF'), ('512000', '券商ETF'), ('512170', '医疗ETF'),
-        ('512010', '医药ETF'), ('515030', '新能源车ETF'), ('512660', '军工ETF'),
-        ('512980', '传媒ETF'), ('512800', '银行ETF'), ('515220', '煤炭ETF'),
-        ('512400', '有色ETF'), ('512200', '房地产ETF'), ('159915', '创业板ETF'),
-        ('159949', '创业板50ETF'), ('588000', '科创50ETF'), ('588080', '科创50ETF易方达'),
-    ]
-    records = []
-    for code, name in etf_list:
-        try:
-            url = f'http://web.ifzq.gtimg.cn/appstock/app/fqkline/get?param={code},day,,,21,qfq'
-            r = requests.get(url, timeout=5).json()
-            kline = r['data'].get(code, {}).get('day', [])
-            if len(kline) < 21: raise RuntimeError('short')
-            df = pd.DataFrame(kline, columns=['day', 'open', 'close', 'high', 'low', 'volume']).astype({'close': float})
-            close = df['close'].iloc[-1]
-            ma5 = df['close'].iloc[-5:].mean()
-            ma20 = df['close'].iloc[-20:].mean()
-            score = 5.0
-            if close > ma20 and ma5 > ma20:
-                score = 4.5 if close > ma5 else 3.5
-            elif close < ma20:
-                score = 2.0
-            records.append({'code': code, 'name': name, 'close': close, 'score': score})
-        except Exception:
-            records.append({'code': code, 'name': name, 'close': 0.0, 'score': 2.0})
-    df = pd.DataFrame(records).sort_values('score', ascending=False)
-    df.to_pickle(cache_file)
+    if _fresh(ETF_CACHE):   # 超过一天的评分视为过期，重新拉取
+        return pd.read_pickle(ETF_CACHE)
+
+    # 各 ETF 互不依赖，线程池并发拉取；map 保持原列表顺序
+    with ThreadPoolExecutor(max_workers=16) as ex:
+        series = list(ex.map(_fetch_closes, ETF_LIST))
+    mat = np.full((len(ETF_LIST), 21), np.nan)
+    for i, closes in enumerate(series):
+        if closes is not None:
+            mat[i] = closes
+    close, score = _score_matrix(mat)
+    codes, names = zip(*ETF_LIST)
+    df = pd.DataFrame({'code': codes, 'name': names, 'close': close, 'score': score})
+    df = df.sort_values('score', ascending=False)
+    if np.isnan(mat[:, -1]).any():   # 有 ETF 取数失败：本次用兜底评分，但不落盘，下次重新拉取
+        return df
+    tmp = f'{ETF_CACHE}.{os.getpid()}.{threading.get_ident()}.tmp'
+    df.to_pickle(tmp, protocol=PICKLE_PROTOCOL)
+    os.replace(tmp, ETF_CACHE)
     return df
 
 # ⑦ AI 结论（规则模拟，可换火山）
-def ai_conclusion(data: dict):
-    liquidity = data['liquidity']
-    sentiment = data['sentiment']
-    north = data['north']
-    margin = data['margin']
-    core = {
-        "核心矛盾解读": {
-            "量价背离": f"总成交 {liquidity:.1f} 亿，较昨日小幅变化，主力分歧加大",
-            "多空博弈": f"赚钱效应 {sentiment:.1f}%，北向资金{north:+.1f}亿，杠杆资金{margin:+.1f}亿",
-            "风格割裂": "科技板块强势，金融权重承压，市场呈结构性分化",
-            "技术面冲突": "指数站上5日线但MACD顶背离，短期震荡需求增加"
-        },
-        "操作建议": {
-            "仓位管理": "维持60%中性仓位，保留10%现金应对波动",
-            "持仓结构调整": {
-                "增持方向": "半导体、光伏、军工等趋势板块回踩5日线机会",
-                "减持方向": "融资余额占比超2.5%的高杠杆品种及破位金融股"
-            },
-            "风险对冲": "可配置10%仓位的国债ETF对冲波动风险",
-            "关键观察点": [
-                "关注科创50能否守住5日线",
-                "跟踪两市融资余额单日变化是否超±100亿",
-                "北向资金连续3日流出需警惕"
-            ]
+# 结论骨架只在导入时序列化一次；每次调用 orjson.loads 得到独立副本，再填入动态字段
+_AI_TEMPLATE = orjson.dumps({
+    "核心矛盾解读": {
+        "量价背离": "",
+        "多空博弈": "",
+        "风格割裂": "科技板块强势，金融权重承压，市场呈结构性分化",
+        "技术面冲突": "指数站上5日线但MACD顶背离，短期震荡需求增加"
+    },
+    "操作建议": {
+        "仓位管理": "维持60%中性仓位，保留10%现金应对波动",
+        "持仓结构调整": {
+            "增持方向": "半导体、光伏、军工等趋势板块回踩5日线机会",
+            "减持方向": "融资余额占比超2.5%的高杠杆品种及破位金融股"
         },
-        "情景推演": {
-            "标题": "明日走势推演",
-            "基准情景": "60%概率维持3350-3400区间震荡，量能回落至3500亿以下",
-            "乐观情景": "30%概率放量突破3420点（需成交超4500亿且北向+80亿）",
-            "悲观情景": "10%概率跌破3330点引发技术抛盘（关注券商是否领跌）"
-        }
+        "风险对冲": "可配置10%仓位的国债ETF对冲波动风险",
+        "关键观察点": [
+            "关注科创50能否守住5日线",
+            "跟踪两市融资余额单日变化是否超±100亿",
+            "北向资金连续3日流出需警惕"
+        ]
+    },
+    "情景推演": {
+        "标题": "明日走势推演",
+        "基准情景": "60%概率维持3350-3400区间震荡，量能回落至3500亿以下",
+        "乐观情景": "30%概率放量突破3420点（需成交超4500亿且北向+80亿）",
+        "悲观情景": "10%概率跌破3330点引发技术抛盘（关注券商是否领跌）"
     }
+})
+
+def ai_conclusion(data: dict):
+    core = orjson.loads(_AI_TEMPLATE)
+    view = core['核心矛盾解读']
+    view['量价背离'] = f"总成交 {data['liquidity']:.1f} 亿，较昨日小幅变化，主力分歧加大"
+    view['多空博弈'] = (f"赚钱效应 {data['sentiment']:.1f}%，北向资金{data['north']:+.1f}亿，"
+                    f"杠杆资金{data['margin']:+.1f}亿")
     return core
 
+REPORT_TMPL = string.Template("""<!DOCTYPE html>
+<html lang="zh-CN"><head><meta charset="utf-8">
+<title>A-Share 全面复盘+AI决策</title>
+<style>
+body{font-family:Consolas,monospace;font-size:14px;line-height:1.6;margin:2rem;}
+h3{color:#444;}
+</style>
+</head><body><pre>$body</pre></body></html>""")
+
 # ---------- 分析 ----------
 def analyze():
-    print(f'--- 运行时间: {datetime.now():%H:%M:%S} ---')
-    # 1. 大盘
-    sh_df = get_index_tx('sh')
-    sz_df = get_index_tx('sz')
-    # 2. 情绪
-    up, down = get_market_activity_sina()
+    run_at = datetime.now()       # 本次运行只取一次时间
+    print(f'--- 运行时间: {run_at:%H:%M:%S} ---')
+    # 各接口互不依赖（且各自兜底异常），线程池并发拉取
+    with ThreadPoolExecutor(max_workers=8) as ex:
+        # 1. 大盘
+        sh_fut = ex.submit(get_index_tx, 'sh')
+        # 2. 情绪
+        activity_fut = ex.submit(get_market_activity_sina)
+        # 3. 两融
+        margin_fut = ex.submit(get_margin_sina)
+        # 4. 北向
+        north_fut = ex.submit(get_north_money_em)
+        # 5. 板块
+        sector_fut = ex.submit(get_sector_tx)
+        # 6. ETF 技术评分
+        etf_fut = ex.submit(get_etf_tech_cached)
+
+        sh = sh_fut.result()
+        up, down = activity_fut.result()
+        margin_bal, margin_chg = margin_fut.result()
+        north = north_fut.result()
+        sector = sector_fut.result()
+        etf_rank = etf_fut.result()
     profit = round(up / (up + down) * 100, 2) if (up + down) > 0 else 50.0
-    # 3. 两融
-    margin_bal, margin_chg = get_margin_sina()
-    # 4. 北向
-    north = get_north_money_em()
-    # 5. 板块
-    sector = get_sector_tx()
-    # 6. ETF 技术评分
-    etf_rank = get_etf_tech_cached()
+    # 保底值
+    sh_close = sh.close if sh else 0.0
+    sh_amount = sh.amount if sh else 0.0
+    sh_amount_yi = sh_amount / 1e8    # 亿元，AI 输入与报告共用
+
     # 7. AI 结论
     ai_data = {
-        'liquidity': (sh_df['amount'].iloc[-1] if not sh_df.empty else 0) / 1e8,
+        'liquidity': sh_amount_yi,
         'sentiment': profit,
         'north': north,
         'margin': margin_chg
     }
     ai_json = ai_conclusion(ai_data)
 
-    # 保底值
-    sh_close = sh_df['close'].iloc[-1] if not sh_df.empty else 0.0
-    sh_amount = sh_df['amount'].iloc[-1] if not sh_df.empty else 0.0
-
     # 拼装全文
-    report = []
-    report.append('=' * 80)
-    report.append(f'A-Share 全面复盘+AI决策  {datetime.now():%Y-%m-%d %H:%M}')
-    report.append('=' * 80)
+    buf = io.StringIO()
+    print('=' * 80, file=buf)
+    print(f'A-Share 全面复盘+AI决策  {run_at:%Y-%m-%d %H:%M}', file=buf)
+    print('=' * 80, file=buf)
 
     # 1. AI 结构化决策
-    report.append('\n一、AI 结构化决策（模拟）')
-    report.append(f"【核心矛盾】{ai_json['核心矛盾解读']['多空博弈']}")
-    report.append(f"【操作建议】{ai_json['操作建议']['仓位管理']}")
-    report.append(f"【情景推演】{ai_json['情景推演']['基准情景']}")
+    print('\n一、AI 结构化决策（模拟）', file=buf)
+    print(f"【核心矛盾】{ai_json['核心矛盾解读']['多空博弈']}", file=buf)
+    print(f"【操作建议】{ai_json['操作建议']['仓位管理']}", file=buf)
+    print(f"【情景推演】{ai_json['情景推演']['基准情景']}", file=buf)
 
     # 2. 纯数据速览
-    report.append(f'\n二、纯数据速览')
-    report.append(f'【大盘】上证 {sh_close:.2f}  成交额 {sh_amount/1e8:.1f} 亿')
-    report.append(f'【情绪】赚钱效应 {profit}%  （上涨 {up} 家  下跌 {down} 家）')
-    report.append(f'【两融】余额 {margin_bal:.2f} 亿  较前日 {margin_chg:+.2f} 亿')
-    report.append(f'【北向】净流入 {north:+.2f} 亿')
+    print(f'\n二、纯数据速览', file=buf)
+    print(f'【大盘】上证 {sh_close:.2f}  成交额 {sh_amount_yi:.1f} 亿', file=buf)
+    print(f'【情绪】赚钱效应 {profit}%  （上涨 {up} 家  下跌 {down} 家）', file=buf)
+    print(f'【两融】余额 {margin_bal:.2f} 亿  较前日 {margin_chg:+.2f} 亿', file=buf)
+    print(f'【北向】净流入 {north:+.2f} 亿', file=buf)
 
     # 3. 板块
     if not sector.empty:
-        report.append('\n三、板块涨跌 TOP10')
-        for _, r in sector.iterrows():
-            report.append(f'  - {r["name"]}  {r["zd"]:+.2f}%')
+        print('\n三、板块涨跌 TOP10', file=buf)
+        lines = '  - ' + sector['name'].astype(str) + '  ' + sector['zd'].map('{:+.2f}%'.format)
+        print('\n'.join(lines), file=buf)
     else:
-        report.append('\n三、板块 接口暂不可用')
+        print('\n三、板块 接口暂不可用', file=buf)
 
     # 4. ETF 技术评分
     if not etf_rank.empty:
-        report.append('\n四、ETF 技术评分（TOP 10）')
-        for _, r in etf_rank.head(10).iterrows():
-            report.append(f'  - {r["name"]}({r["code"]})  得分 {r["score"]:.1f}  现价 {r["close"]:.3f}')
+        print('\n四、ETF 技术评分（TOP 10）', file=buf)
+        top = etf_rank.head(10)
+        lines = ('  - ' + top['name'] + '(' + top['code'] + ')  得分 ' + top['score'].map('{:.1f}'.format)
+                 + '  现价 ' + top['close'].map('{:.3f}'.format))
+        print('\n'.join(lines), file=buf)
     else:
-        report.append('\n四、ETF 接口暂不可用')
+        print('\n四、ETF 接口暂不可用', file=buf)
 
-    report.append('\n' + '=' * 80)
-    report.append('免责声明: 仅供参考，不构成投资建议。')
-    report.append('=' * 80)
-    full_text = '\n'.join(report)
+    print('\n' + '=' * 80, file=buf)
+    print('免责声明: 仅供参考，不构成投资建议。', file=buf)
+    print('=' * 80, file=buf)
+    full_text = buf.getvalue()
 
     # 写网页
-    with open('reports/index.html', 'w', encoding='utf-8') as f:
-        f.write(f"""<!DOCTYPE html>
-<html lang="zh-CN"><head><meta charset="utf-8">
-<title>A-Share 全面复盘+AI决策</title>
-<style>
-body{{font-family:Consolas,monospace;font-size:14px;line-height:1.6;margin:2rem;}}
-h3{{color:#444;}}
-</style>
-</head><body><pre>{full_text}</pre></body></html>""")
+    Path('reports/index.html').write_text(REPORT_TMPL.substitute(body=full_text), encoding='utf-8')
     print('全面复盘+AI 报告已生成：reports/index.html')
 
 # ---------- 入口 ----------
@@ -1,23 +1,78 @@
 # volces_chat.py
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import json
+import orjson
 import re
+import os
+import time
+import threading
+import hashlib
+from pathlib import Path
  
  
 VOLCES_API_KEY = "xxxxxxxxx"   # 替换成自己的 key
 ENDPOINT = "https://ark.cn-beijing.volces.com/api/v3/bots/chat/completions"
 # MODEL = "deepseek-v3-250324"
 MODEL = "xxxxxxxx" # 模型名称
+LLM_CACHE_DIR = Path("cache/llm")   # 相同提示词的返回按哈希落盘
+LLM_CACHE_TTL = 900                 # 秒；盘中 15 分钟，盘后可传 86400
  
+# 复用连接与 TLS 会话；POST 默认不重试读错误，只重试连接失败
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(pool_maxsize=32, max_retries=Retry(total=2, backoff_factor=0.3)))
  
-def chat_volces(system: str, user: str, timeout: int = 30) -> str:
+ 
+def _cache_file(system: str, user: str) -> Path:
+    key = hashlib.sha256(f"{MODEL}\x1f{system}\x1f{user}".encode("utf-8")).hexdigest()
+    return LLM_CACHE_DIR / f"{key}.txt"
+ 
+ 
+def _write_cache(cache_file: Path, text: str):
+    """先写临时文件再 os.replace，并发读取时不会读到半截内容"""
+    LLM_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    tmp = cache_file.with_name(f"{cache_file.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    tmp.write_text(text, encoding="utf-8")
+    os.replace(tmp, cache_file)
+ 
+ 
+def _read_stream(resp):
+    """逐行解析 SSE 的 data: 帧，边到边打印；返回 (全文, 是否收到 [DONE])"""
+    parts = []
+    done = False
+    for line in resp.iter_lines():
+        if not line.startswith(b"data:"):
+            continue
+        data = line[5:].strip()
+        if data == b"[DONE]":
+            done = True
+            break
+        choices = orjson.loads(data).get("choices")
+        if not choices:   # 如末尾的 usage 帧，choices 为空
+            continue
+        delta = choices[0].get("delta", {}).get("content") or ""
+        print(delta, end="", flush=True)
+        parts.append(delta)
+    print()
+    return "".join(parts), done
+ 
+ 
+def chat_volces(system: str, user: str, timeout: int = 30, cache_ttl: int = LLM_CACHE_TTL,
+                stream: bool = False) -> str:
     """
     调用火山方舟 DeepSeek 模型的同步接口
     :param system: system prompt
     :param user:   user prompt
     :param timeout: 请求超时时间（秒）
+    :param cache_ttl: 相同提示词结果的缓存有效期（秒），0 表示不缓存
+    :param stream:  流式返回，首个 token 到达即开始输出
     :return: 模型返回文本
     """
+    cache_file = _cache_file(system, user)
+    if cache_ttl > 0 and cache_file.exists() and time.time() - cache_file.stat().st_mtime < cache_ttl:
+        return cache_file.read_text(encoding="utf-8")
+ 
     headers = {
         "Authorization": f"Bearer {VOLCES_API_KEY}",
         "Content-Type": "application/json"
@@ -25,7 +80,7 @@ def chat_volces(system: str, user: str, timeout: int = 30) -> str:
  
     payload = {
         "model": MODEL,
-        "stream": False,
+        "stream": stream,
         "messages": [
             {"role": "system", "content": system},
             {"role": "user",   "content": user}
@@ -35,10 +90,18 @@ def chat_volces(system: str, user: str, timeout: int = 30) -> str:
  
     try:
         print(f"正在调用火山方舟模型...请求参数为{system};{user}")
-        resp = requests.post(ENDPOINT, json=payload, headers=headers, timeout=timeout)
-        resp.raise_for_status()
-        content_str = resp.json()["choices"][0]["message"]["content"]
-        print(f"返回结果为：{content_str}")
+        # with 保证流式读取中途出错时也关闭响应，连接归还连接池
+        with SESSION.post(ENDPOINT, json=payload, headers=headers, timeout=timeout, stream=stream) as resp:
+            resp.raise_for_status()
+            if stream:
+                print("返回结果为：", end="")
+                content_str, complete = _read_stream(resp)
+            else:
+                content_str = orjson.loads(resp.content)["choices"][0]["message"]["content"]
+                complete = True
+                print(f"返回结果为：{content_str}")
+        if cache_ttl > 0 and complete:   # 只缓存完整的成功结果；被截断的流和异常信息不落盘
+            _write_cache(cache_file, content_str)
         return content_str
         # # 2. 智能清洗内容，提取纯净的JSON部分
         # json_match = re.search(r'\[[\s\S]*\]', content_str)